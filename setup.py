@@ -50,5 +50,11 @@ setup(
     # List run-time dependencies here.  These will be installed by pip when your project is installed.
     install_requires=['requests', 'pandas'],
 
+    # Optional dependencies for faster response download and parsing.
+    extras_require={
+        'fast': ['orjson', 'ijson', 'brotli', 'pyarrow'],
+        'async': ['aiohttp'],
+    },
+
     include_package_data=True,
 )
\ No newline at end of file
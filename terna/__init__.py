@@ -1 +1 @@
-from .terna import TernaPandasClient, __version__
\ No newline at end of file
+from .terna import TernaPandasClient, AsyncTernaPandasClient, __version__
\ No newline at end of file
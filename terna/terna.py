@@ -5,12 +5,39 @@
 # Created Date: Sunday 15 January 2023 at 19:31
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 import datetime
 import time
+import threading
 import logging
-from typing import Optional, Dict
-from urllib.parse import urlencode
+import asyncio
+import itertools
+import io
+from typing import Optional, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 __title__ = "terna-py"
 __version__ = "0.4.0"
@@ -20,83 +47,133 @@ __license__ = "MIT"
 URL = 'https://api.terna.it/transparency/oauth/accessToken'
 BASE_URL = 'https://api.terna.it/transparency/v1.0/'
 
+_logger = logging.getLogger(__name__)
+RATE_LIMIT = 1.05 # minimum spacing in seconds between two API requests
+HEADERS = {'accept': 'application/json'} # sent with every data request
+RETRY_STATUS = [429, 500, 502, 503, 504] # responses retried by TernaPandasClient
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5 # n-th retry waits at least BACKOFF_FACTOR * 2**n seconds (and RATE_LIMIT)
+# responses larger than STREAM_THRESHOLD (bytes) are stream-parsed with ijson to bound memory;
+# those between ARROW_THRESHOLD and STREAM_THRESHOLD (or above, without ijson) are parsed with pyarrow.
+# Both are compared against Content-Length, i.e. the compressed size for gzip/br encoded bodies.
+STREAM_THRESHOLD = 10 * 1024 * 1024
+ARROW_THRESHOLD = 5 * 1024 * 1024
+# avoid a full copy when concatenating chunks; pandas >= 3 copies lazily and deprecates the keyword
+CONCAT_KWARGS = {} if int(pd.__version__.split('.')[0]) >= 3 else {'copy': False}
+
+# offsets subtracted by adjust_tz, indexed by minute % 15
+TZ_OFFSET_MINUTES = np.array([d+15*(4-d) if d else 0 for d in range(15)])
+TZ_OFFSETS = tuple(datetime.timedelta(minutes=int(m)) for m in TZ_OFFSET_MINUTES)
+
 class TernaPandasClient:
+    __slots__ = (
+        'api_key', 'api_secret', 'session', 'proxies', 'timeout',
+        'token', 'token_expiration', 'next_allowed', 'token_lock', '_token_payload', 'logger',
+    )
+
     def __init__(
             self, api_key: str, api_secret: str, session: Optional[requests.Session] = None,
-            proxies: Optional[Dict] = None, timeout: Optional[int] = None):
+            proxies: Optional[Dict] = None, timeout: Optional[int] = None, log_level: Optional[int] = None):
         """
         Parameters
         ----------
-        api_client : str
+        api_key : str
         api_secret : str
         session : requests.Session
         proxies : dict
             requests proxies
         timeout : int
+        log_level : int
+            level of the terna logger, left unchanged if None
         """
+        self.logger = _logger
+        if log_level is not None:
+            _logger.setLevel(log_level)
         if api_key is None:
             raise TypeError("API key cannot be None")
         if api_secret is None:
             raise TypeError("API secret cannot be None")
         self.api_key = api_key
         self.api_secret = api_secret
+        self._token_payload = {
+            'client_id': api_key,
+            'client_secret': api_secret,
+            'grant_type': 'client_credentials',
+        }
         if session is None:
             session = requests.Session()
+            # urllib3 retries bypass the rate limit, so they only cover connection errors (which never
+            # reach the API); 429 and 5xx responses are retried by _send
+            retry = Retry(connect=MAX_RETRIES, read=0, status=0, other=0, backoff_factor=BACKOFF_FACTOR)
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retry)
+            session.mount('https://', adapter)
         self.session = session
         self.proxies = proxies
         self.timeout = timeout
         self.token = None
         self.token_expiration = datetime.datetime.now()
-        self.time_of_last_request = time.monotonic() - 1
+        self.next_allowed = 0.0
+        self.token_lock = threading.Lock()
 
-    def _request_token(self, data: Dict = {}) -> str:
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
         """
         Parameters
         ----------
-        data : dict
+        method : str
+        url : str
+        kwargs
+            passed to requests.Session.request
         
+        Returns
+        -------
+        requests.Response
+        """
+
+        for attempt in range(MAX_RETRIES + 1):
+            wait = self.next_allowed - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.next_allowed = time.monotonic() + RATE_LIMIT
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                return response
+            delay = retry_delay(response.headers, attempt)
+            self.logger.debug("%s %s, retrying in %s s", response.status_code, url, max(delay, RATE_LIMIT))
+            self.next_allowed = max(self.next_allowed, time.monotonic() + delay)
+            response.close()
+
+    def _request_token(self) -> str:
+        """
         Returns
         -------
         access_token : str
         """
         
-        if self.token_expiration + datetime.timedelta(seconds=5) < datetime.datetime.now() and self.token:
-            return self.token
+        with self.token_lock:
+            if self.token and datetime.datetime.now() + datetime.timedelta(seconds=30) < self.token_expiration:
+                return self.token
 
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        base_data = {
-            'client_id': self.api_key,
-            'client_secret': self.api_secret,
-            'grant_type': 'client_credentials',
-        }
-        data.update(base_data)
-
-        try:
-            time_elapsed = time.monotonic() - self.time_of_last_request
-            if time_elapsed < 1.05:
-                time.sleep(1.05-time_elapsed)
-            response = self.session.post(URL, headers=headers, data=data)
-            self.time_of_last_request = time.monotonic()
-            response.raise_for_status()
-
-        except requests.HTTPError as exc:
-            code = exc.response.status_code
-            logging.debug(response.text)
-            if code in [429, 500, 502, 503, 504]:
-                logging.debug(code)
-            raise
-        
-        else:
-            if response.status_code == 200:
-                token = response.json()['access_token']
-                expires_in = response.json()['expires_in']
-                self.token_expiration = datetime.datetime.now() + datetime.timedelta(seconds=expires_in)
-                self.token = token
-                return token
+            headers = {
+                'Content-Type': 'application/x-www-form-urlencoded'
+            }
+
+            try:
+                response = self._send('POST', URL, headers=headers, data=self._token_payload)
+                response.raise_for_status()
+
+            except requests.HTTPError as exc:
+                code = exc.response.status_code
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(response.text)
+                if code in RETRY_STATUS:
+                    self.logger.debug(code)
+                raise
+        
             else:
-                return None
+                json = response.json()
+                self.token_expiration = datetime.datetime.now() + datetime.timedelta(seconds=json['expires_in'])
+                self.token = json['access_token']
+                return self.token
     
     def _base_request(self, item, data: Dict) -> pd.DataFrame:
         """
@@ -110,48 +187,38 @@ class TernaPandasClient:
         """
 
         access_token = self._request_token()
-        data.update({'access_token': access_token})
-        params = urlencode(data, doseq=True)
-        _url =  "{}{}?{}".format(BASE_URL, item, params)
-        logging.debug(_url)
-        
-        try:
-            time_elapsed = time.monotonic() - self.time_of_last_request
-            if time_elapsed < 1.05:
-                time.sleep(1.05-time_elapsed)
-            response = self.session.get(_url)
-            self.time_of_last_request = time.monotonic()
-            response.raise_for_status()
-
-        except requests.HTTPError as exc:
-            code = exc.response.status_code
-            logging.debug(response.text)
-            if code in [429, 500, 502, 503, 504]:
-                logging.debug(code)
-            raise
-        else:
-            if response.status_code == 200:
-                json = response.json()
-                if 'result' in json:
-                    json.pop('result')
-                    key = list(json.keys())[0]
-                    df = pd.json_normalize(json[key])
-                    if 'Date' in df.columns:
-                        df['Date'] = pd.to_datetime(df['Date'])
-                        df['Date'] = df['Date'].map(lambda x: adjust_tz(x, tz="Europe/Rome"))
-                        df.sort_values(by='Date', inplace=True)
-                        df.index = df['Date']
-                        df.index.name = None
-                        df.drop(columns=['Date'], inplace=True)
-                    elif 'Year' in df.columns:
-                        df.index = df['Year']
-                        df.drop(columns=['Year'], inplace=True)
-                    df = df.apply(pd.to_numeric, errors='ignore')
-                    return df
-                else:
-                    return None
+        params = dict(data, access_token=access_token)
+        _url = BASE_URL + item
+        self.logger.debug("%s %s", _url, data)
+        
+        # close the (possibly streamed) response on every path so its pooled connection is released
+        with self._send('GET', _url, params=params, headers=HEADERS, stream=ijson is not None) as response:
+            try:
+                response.raise_for_status()
+
+            except requests.HTTPError as exc:
+                code = exc.response.status_code
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(response.text)
+                if code in RETRY_STATUS:
+                    self.logger.debug(code)
+                raise
             else:
-                return None
+                self.logger.debug("Content-Encoding: %s", response.headers.get('Content-Encoding'))
+                content_length = int(response.headers.get('Content-Length', 0))
+                if ijson is not None and content_length > STREAM_THRESHOLD:
+                    # build the records straight from the socket, without holding the raw body in memory
+                    response.raw.decode_content = True
+                    json = dict(ijson.kvitems(response.raw, '', use_float=True))
+                elif pa is not None and content_length > ARROW_THRESHOLD:
+                    try:
+                        return parse_response_arrow(response.content)
+                    except pa.ArrowInvalid as exc:
+                        self.logger.debug(exc)
+                    json = orjson.loads(response.content) if orjson else response.json()
+                else:
+                    json = orjson.loads(response.content) if orjson else response.json()
+                return parse_response(json)
     
     def get_total_load(self, start: pd.Timestamp, end: pd.Timestamp, bzone: str) -> pd.DataFrame:
         """
@@ -167,8 +234,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
             'biddingZone': bzone
         }
         item = 'gettotalload'
@@ -176,6 +243,27 @@ class TernaPandasClient:
         df = self._base_request(item, data)
         return df
 
+    def get_total_load_range(self, start: pd.Timestamp, end: pd.Timestamp, bzone: str, chunk: str = '90D') -> pd.DataFrame:
+        """
+        Parameters
+        ----------
+        start : pd.Timestamp
+        end : pd.Timestamp
+        bzone : str
+        chunk : str
+            maximum length of the date range fetched by a single request
+        
+        Returns
+        -------
+        pd.DataFrame
+        """
+
+        frames = [self.get_total_load(chunk_start, chunk_end, bzone) for chunk_start, chunk_end in date_chunks(start, end, chunk)]
+        frames = [df for df in frames if df is not None]
+        if not frames:
+            return None
+        return pd.concat(frames, sort=False, **CONCAT_KWARGS)
+
     def get_market_load(self, start: pd.Timestamp, end: pd.Timestamp, bzone: str) -> pd.DataFrame:
         """
         Parameters
@@ -190,8 +278,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
             'biddingZone': bzone
         }
         item = 'getmarketload'
@@ -213,8 +301,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
             'type': gen_type
         }
         item = 'getactualgeneration'
@@ -236,8 +324,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
             'type': res_gen_type
         }
         item = 'getrenewablegeneration'
@@ -259,8 +347,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
             'type': type
         }
         item = 'getenergybalance'
@@ -301,8 +389,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
         }
         item = 'getscheduledforeignexchange'
 
@@ -322,8 +410,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
         }
         item = 'getscheduledinternalexchange'
 
@@ -343,8 +431,8 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
         }
         item = 'getphysicalforeignflow'
 
@@ -364,19 +452,299 @@ class TernaPandasClient:
         """
         
         data = {
-            'dateFrom': start.strftime('%d/%m/%Y'),
-            'dateTo': end.strftime('%d/%m/%Y'),
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
         }
         item = 'getphysicalinternalflow'
 
         df = self._base_request(item, data)
         return df
     
+class AsyncTernaPandasClient:
+    def __init__(
+            self, api_key: str, api_secret: str, session: Optional['aiohttp.ClientSession'] = None,
+            limit: int = 64, rate_limit: float = RATE_LIMIT, log_level: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        api_key : str
+        api_secret : str
+        session : aiohttp.ClientSession
+        limit : int
+            maximum number of simultaneous connections
+        rate_limit : float
+            minimum spacing in seconds between two API requests
+        log_level : int
+            level of the terna logger, left unchanged if None
+        """
+        self.logger = _logger
+        if log_level is not None:
+            _logger.setLevel(log_level)
+        if aiohttp is None:
+            raise ImportError("AsyncTernaPandasClient requires aiohttp")
+        if api_key is None:
+            raise TypeError("API key cannot be None")
+        if api_secret is None:
+            raise TypeError("API secret cannot be None")
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._token_payload = {
+            'client_id': api_key,
+            'client_secret': api_secret,
+            'grant_type': 'client_credentials',
+        }
+        self.session = session
+        # only sessions created by the client are closed by it
+        self._owns_session = False
+        self.limit = limit
+        self.rate_limit = rate_limit
+        self.token = None
+        self.token_expiration = datetime.datetime.now()
+        self.request_times = []
+        self.next_allowed = 0.0
+        # asyncio primitives must be created inside the running event loop
+        self._semaphore = None
+        self._throttle_lock = None
+        self._token_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session:
+            if not self.session.closed:
+                await self.session.close()
+            self.session = None
+            self._owns_session = False
+        # the asyncio primitives are bound to the current event loop, recreate them on next use
+        self._semaphore = None
+        self._throttle_lock = None
+        self._token_lock = None
+        self.request_times = []
+        self.next_allowed = 0.0
+
+    def _start(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit))
+            self._owns_session = True
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._throttle_lock = asyncio.Lock()
+            self._token_lock = asyncio.Lock()
+
+    async def _throttle(self):
+        # token bucket of one request per rate_limit window, held back further after a retried response
+        async with self._throttle_lock:
+            while True:
+                now = time.monotonic()
+                self.request_times = [t for t in self.request_times if now - t < self.rate_limit]
+                wait = self.next_allowed - now
+                if self.request_times:
+                    wait = max(wait, self.request_times[0] + self.rate_limit - now)
+                if wait <= 0:
+                    self.request_times.append(now)
+                    return
+                await asyncio.sleep(wait)
+
+    async def _send(self, method: str, url: str, **kwargs) -> 'aiohttp.ClientResponse':
+        """
+        Parameters
+        ----------
+        method : str
+        url : str
+        kwargs
+            passed to aiohttp.ClientSession.request
+        
+        Returns
+        -------
+        aiohttp.ClientResponse
+        """
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self._throttle()
+            response = await self.session.request(method, url, **kwargs)
+            if response.status not in RETRY_STATUS or attempt == MAX_RETRIES:
+                return response
+            delay = retry_delay(response.headers, attempt)
+            self.logger.debug("%s %s, retrying in %s s", response.status, url, max(delay, self.rate_limit))
+            self.next_allowed = max(self.next_allowed, time.monotonic() + delay)
+            response.release()
+
+    async def _request_token(self) -> str:
+        """
+        Returns
+        -------
+        access_token : str
+        """
+
+        async with self._token_lock:
+            if self.token and datetime.datetime.now() + datetime.timedelta(seconds=30) < self.token_expiration:
+                return self.token
+
+            async with await self._send('POST', URL, data=self._token_payload) as response:
+                if response.status >= 400 and self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(await response.text())
+                response.raise_for_status()
+                json = await response.json(content_type=None)
+            self.token_expiration = datetime.datetime.now() + datetime.timedelta(seconds=json['expires_in'])
+            self.token = json['access_token']
+            return self.token
+
+    async def _base_request(self, item, data: Dict) -> pd.DataFrame:
+        """
+        Parameters
+        ----------
+        data : dict
+        
+        Returns
+        -------
+        pd.DataFrame
+        """
+
+        self._start()
+        async with self._semaphore:
+            access_token = await self._request_token()
+            # aiohttp does not expand list values, so repeat the key for each of them
+            params = [
+                (key, value)
+                for key, values in dict(data, access_token=access_token).items()
+                for value in (values if isinstance(values, (list, tuple)) else [values])
+            ]
+            _url = BASE_URL + item
+            self.logger.debug("%s %s", _url, data)
+
+            async with await self._send('GET', _url, params=params) as response:
+                if response.status >= 400 and self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(await response.text())
+                response.raise_for_status()
+                if orjson:
+                    json = orjson.loads(await response.read())
+                else:
+                    json = await response.json(content_type=None)
+        return parse_response(json)
+
+    async def get_total_load(self, start: pd.Timestamp, end: pd.Timestamp, bzone: str) -> pd.DataFrame:
+        """
+        Parameters
+        ----------
+        start : pd.Timestamp
+        end : pd.Timestamp
+        bzone : str
+        
+        Returns
+        -------
+        pd.DataFrame
+        """
+        
+        data = {
+            'dateFrom': format_date(start),
+            'dateTo': format_date(end),
+            'biddingZone': bzone
+        }
+        item = 'gettotalload'
+
+        df = await self._base_request(item, data)
+        return df
+
+    async def get_total_load_many(self, ranges: List[Tuple[pd.Timestamp, pd.Timestamp]], bzones: List[str]) -> pd.DataFrame:
+        """
+        Parameters
+        ----------
+        ranges : list of (pd.Timestamp, pd.Timestamp)
+        bzones : list of str
+        
+        Returns
+        -------
+        pd.DataFrame
+        """
+
+        frames = await asyncio.gather(*[
+            self.get_total_load(start, end, bzone) for (start, end), bzone in itertools.product(ranges, bzones)
+        ])
+        frames = [df for df in frames if df is not None]
+        if not frames:
+            return None
+        return pd.concat(frames, sort=False, **CONCAT_KWARGS).sort_index(kind='stable')
+
+def format_date(ts: pd.Timestamp) -> str:
+    # DD/MM/YYYY as expected by the API, without going through strftime
+    return f"{ts.day:02d}/{ts.month:02d}/{ts.year:04d}"
+
+def retry_delay(headers, attempt: int) -> float:
+    # seconds to hold back the next request after a RETRY_STATUS response
+    retry_after = headers.get('Retry-After', '')
+    return int(retry_after) if retry_after.isdigit() else BACKOFF_FACTOR * 2 ** attempt
+
+def date_chunks(start: pd.Timestamp, end: pd.Timestamp, freq: str) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    # split [start, end] into consecutive inclusive date ranges at freq boundaries;
+    # anchored frequencies (e.g. 'MS') need not land on start, so the first chunk always begins there
+    if start > end:
+        return []
+    bounds = [start] + [b for b in pd.date_range(start, end, freq=freq) if b > start]
+    return [
+        (chunk_start, chunk_end - pd.DateOffset(days=1))
+        for chunk_start, chunk_end in zip(bounds, bounds[1:])
+    ] + [(bounds[-1], end)]
+
+def parse_response(json: Dict) -> pd.DataFrame:
+    if 'result' not in json:
+        return None
+    json.pop('result')
+    key = list(json.keys())[0]
+    records = json[key]
+    if records and isinstance(records[0], dict) and any(isinstance(v, (dict, list)) for v in records[0].values()):
+        df = pd.json_normalize(records)
+    else:
+        df = pd.DataFrame(records)
+    return format_frame(df)
+
+def parse_response_arrow(content: bytes) -> pd.DataFrame:
+    # parse the whole body in C++ with pyarrow; the response is a single JSON object,
+    # so the block size must cover all of it
+    table = pa_json.read_json(io.BytesIO(content), read_options=pa_json.ReadOptions(block_size=len(content)+1))
+    if 'result' not in table.column_names:
+        return None
+    key = [name for name in table.column_names if name != 'result'][0]
+    records = table.column(key).chunk(0)[0].values
+    if records is None or not pa.types.is_struct(records.type):
+        return format_frame(pd.DataFrame())
+    table = pa.Table.from_struct_array(records)
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    # Arrow infers timestamps from ISO strings; turn them back into strings so that every
+    # column goes through the same conversions (and ends up with the same dtype) as in parse_response
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    return format_frame(table.to_pandas())
+
+def format_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if 'Date' in df.columns:
+        df['Date'] = adjust_tz_series(pd.to_datetime(df['Date']), tz="Europe/Rome")
+        df = df.set_index('Date').rename_axis(None).sort_index(kind='stable')
+    elif 'Year' in df.columns:
+        df.set_index('Year', inplace=True)
+    df = df.apply(convert_numeric)
+    return df
+
 def adjust_tz(dt, tz):
     delta = dt.minute % 15
-    if delta == 0:
-        return dt.tz_localize(tz, ambiguous=True)
-    else:
-        return (dt - datetime.timedelta(minutes=delta+15*(4-delta))).tz_localize(tz, ambiguous=False)
-        
-        
\ No newline at end of file
+    return (dt - TZ_OFFSETS[delta]).tz_localize(tz, ambiguous=(delta == 0))
+
+def adjust_tz_series(dates, tz):
+    # vectorized equivalent of adjust_tz over a whole Series
+    delta = dates.dt.minute.to_numpy() % 15
+    shifted = dates - pd.to_timedelta(TZ_OFFSET_MINUTES[delta], unit='m')
+    return shifted.dt.tz_localize(tz, ambiguous=(delta == 0))
+
+def convert_numeric(col):
+    # equivalent of pd.to_numeric(col, errors='ignore'), which pandas no longer supports
+    if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    try:
+        return pd.to_numeric(col)
+    except (ValueError, TypeError):
+        return col
@@ -0,0 +1,245 @@
+import json
+from unittest import mock
+
+import pandas as pd
+import pytest
+import requests
+
+from terna.terna import (
+    adjust_tz, adjust_tz_series, date_chunks, format_date, parse_response, parse_response_arrow,
+)
+
+
+def _formatted(chunks):
+    return [(format_date(start), format_date(end)) for start, end in chunks]
+
+
+def test_date_chunks_fixed_frequency():
+    start = pd.Timestamp("20210101", tz='Europe/Rome')
+    end = pd.Timestamp("20211231", tz='Europe/Rome')
+    assert _formatted(date_chunks(start, end, '90D')) == [
+        ('01/01/2021', '31/03/2021'),
+        ('01/04/2021', '29/06/2021'),
+        ('30/06/2021', '27/09/2021'),
+        ('28/09/2021', '26/12/2021'),
+        ('27/12/2021', '31/12/2021'),
+    ]
+
+
+def test_date_chunks_anchored_frequency_keeps_start():
+    start = pd.Timestamp("20210115", tz='Europe/Rome')
+    end = pd.Timestamp("20210410", tz='Europe/Rome')
+    assert _formatted(date_chunks(start, end, 'MS')) == [
+        ('15/01/2021', '31/01/2021'),
+        ('01/02/2021', '28/02/2021'),
+        ('01/03/2021', '31/03/2021'),
+        ('01/04/2021', '10/04/2021'),
+    ]
+    assert _formatted(date_chunks(start, end, 'W-MON'))[0] == ('15/01/2021', '17/01/2021')
+
+
+def test_date_chunks_single_day():
+    day = pd.Timestamp("20210101", tz='Europe/Rome')
+    assert _formatted(date_chunks(day, day, '90D')) == [('01/01/2021', '01/01/2021')]
+    assert _formatted(date_chunks(day, day, 'MS')) == [('01/01/2021', '01/01/2021')]
+
+
+def test_date_chunks_empty_range():
+    start = pd.Timestamp("20210102", tz='Europe/Rome')
+    end = pd.Timestamp("20210101", tz='Europe/Rome')
+    assert date_chunks(start, end, '90D') == []
+
+
+def test_parse_response_arrow_matches_parse_response():
+    pytest.importorskip('pyarrow')
+    records = [
+        {'Date': '2022-10-30 02:%02d:00' % (i % 60), 'Total_Load_MW': '%d.5' % i, 'Bidding_Zone': 'NORD'}
+        for i in range(100)
+    ]
+    content = json.dumps({'result': {'status': 'OK'}, 'totalLoad': records}).encode()
+    expected = parse_response(json.loads(content))
+    df = parse_response_arrow(content)
+    pd.testing.assert_frame_equal(df, expected)
+    assert df.index.dtype == expected.index.dtype
+
+
+async def _serve(handlers):
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_post('/token', handlers['token'])
+    app.router.add_get('/api/gettotalload', handlers['gettotalload'])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, 'http://{}:{}/'.format(host, port)
+
+
+def _async_handlers(gets):
+    from aiohttp import web
+
+    async def token(request):
+        return web.json_response({'access_token': 'token', 'expires_in': 3600})
+
+    async def gettotalload(request):
+        gets.append(request.query.getall('biddingZone'))
+        return web.json_response(
+            {'result': {}, 'totalLoad': [{'Date': '2022-01-01 00:00:00', 'Total_Load_MW': '1.5'}]})
+
+    return {'token': token, 'gettotalload': gettotalload}
+
+
+def test_async_client_reusable_across_event_loops(monkeypatch):
+    pytest.importorskip('aiohttp')
+    import asyncio
+    import terna.terna as terna_module
+
+    gets = []
+    client = terna_module.AsyncTernaPandasClient('key', 'secret', rate_limit=0.01)
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+
+    async def run():
+        runner, base = await _serve(_async_handlers(gets))
+        monkeypatch.setattr(terna_module, 'URL', base + 'token')
+        monkeypatch.setattr(terna_module, 'BASE_URL', base + 'api/')
+        try:
+            async with client:
+                return await client.get_total_load_many([(day, day)], ['NORD', 'SUD'])
+        finally:
+            await runner.cleanup()
+
+    for _ in range(2):
+        df = asyncio.run(run())
+        assert len(df) == 2
+    assert sorted(gets) == [['NORD'], ['NORD'], ['SUD'], ['SUD']]
+
+
+def test_async_client_retries_rate_limited_response(monkeypatch):
+    pytest.importorskip('aiohttp')
+    import asyncio
+    from aiohttp import web
+    import terna.terna as terna_module
+
+    gets = []
+    handlers = _async_handlers(gets)
+    ok = handlers['gettotalload']
+
+    async def rate_limited_once(request):
+        if not gets:
+            gets.append(None)
+            return web.json_response({}, status=429, headers={'Retry-After': '0'})
+        return await ok(request)
+
+    handlers['gettotalload'] = rate_limited_once
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+
+    async def run():
+        runner, base = await _serve(handlers)
+        monkeypatch.setattr(terna_module, 'URL', base + 'token')
+        monkeypatch.setattr(terna_module, 'BASE_URL', base + 'api/')
+        try:
+            async with terna_module.AsyncTernaPandasClient('key', 'secret', rate_limit=0.01) as client:
+                return await client.get_total_load(day, day, 'NORD')
+        finally:
+            await runner.cleanup()
+
+    df = asyncio.run(run())
+    assert gets == [None, ['NORD']]
+    assert df['Total_Load_MW'].tolist() == [1.5]
+
+
+def _response(status, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload or {}).encode()
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    response.url = 'https://api.terna.it/'
+    response.close = mock.Mock()
+    return response
+
+
+def _token_response(expires_in=3600):
+    return _response(200, {'access_token': 'token', 'expires_in': expires_in})
+
+
+def _load_response():
+    return _response(200, {'result': {}, 'totalLoad': [{'Date': '2022-01-01 00:00:00', 'Total_Load_MW': '1.5'}]})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import terna.terna as terna_module
+    monkeypatch.setattr(terna_module, 'RATE_LIMIT', 0)
+    monkeypatch.setattr(terna_module, 'BACKOFF_FACTOR', 0)
+    return terna_module.TernaPandasClient('key', 'secret', session=mock.Mock(spec=requests.Session))
+
+
+def _methods(session):
+    return [call.args[0] for call in session.request.call_args_list]
+
+
+def test_error_response_is_closed(client):
+    error = _response(404)
+    client.session.request.side_effect = [_token_response(), error]
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+    with pytest.raises(requests.HTTPError):
+        client.get_total_load(day, day, 'NORD')
+    error.close.assert_called()
+
+
+def test_token_is_reused_until_close_to_expiry(client):
+    client.session.request.side_effect = [_token_response(), _load_response(), _load_response()]
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+    client.get_total_load(day, day, 'NORD')
+    client.get_total_load(day, day, 'NORD')
+    assert _methods(client.session) == ['POST', 'GET', 'GET']
+
+
+def test_token_close_to_expiry_is_refreshed(client):
+    client.session.request.side_effect = [_token_response(expires_in=20), _load_response(), _token_response(), _load_response()]
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+    client.get_total_load(day, day, 'NORD')
+    client.get_total_load(day, day, 'NORD')
+    assert _methods(client.session) == ['POST', 'GET', 'POST', 'GET']
+
+
+@pytest.mark.parametrize('dates', [
+    # end of DST: the repeated hour and its marked quarter-hours
+    ['2022-10-30 01:45:00', '2022-10-30 02:00:00', '2022-10-30 02:15:00', '2022-10-30 02:01:00',
+     '2022-10-30 02:16:00', '2022-10-30 03:00:00'],
+    # start of DST
+    ['2022-03-27 01:30:00', '2022-03-27 01:45:00', '2022-03-27 03:00:00', '2022-03-27 03:15:00'],
+    ['2022-06-01 12:00:00', '2022-06-01 12:15:00'],
+])
+def test_adjust_tz_series_matches_adjust_tz(dates):
+    dates = pd.Series(pd.to_datetime(dates))
+    expected = dates.map(lambda dt: adjust_tz(dt, tz='Europe/Rome'))
+    pd.testing.assert_series_equal(adjust_tz_series(dates, tz='Europe/Rome'), expected)
+
+
+def test_send_retries_server_error(client):
+    client.session.request.side_effect = [_response(503), _response(200)]
+    response = client._send('GET', 'https://api.terna.it/')
+    assert response.status_code == 200
+    assert client.session.request.call_count == 2
+
+
+def test_send_returns_last_error_when_retries_run_out(client):
+    import terna.terna as terna_module
+    client.session.request.side_effect = [_token_response()] + [_response(503) for _ in range(terna_module.MAX_RETRIES + 1)]
+    day = pd.Timestamp("20220101", tz='Europe/Rome')
+    with pytest.raises(requests.HTTPError) as exc:
+        client.get_total_load(day, day, 'NORD')
+    assert exc.value.response.status_code == 503
+    assert _methods(client.session) == ['POST'] + ['GET'] * (terna_module.MAX_RETRIES + 1)
+
+
+def test_send_honours_retry_after(client, monkeypatch):
+    import terna.terna as terna_module
+    sleeps = []
+    monkeypatch.setattr(terna_module.time, 'sleep', sleeps.append)
+    client.session.request.side_effect = [_response(429, headers={'Retry-After': '30'}), _response(200)]
+    assert client._send('GET', 'https://api.terna.it/').status_code == 200
+    assert len(sleeps) == 1 and 29 < sleeps[0] <= 30